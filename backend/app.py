@@ -1,5 +1,10 @@
 import os
 import json
+import hashlib
+import time
+import uuid
+import threading
+from collections import OrderedDict
 import PyPDF2
 from openai import OpenAI
 from flask import Flask, request, jsonify
@@ -13,7 +18,9 @@ try:
     from config import (
         SECRET_KEY, MAX_CONTENT_LENGTH, UPLOAD_FOLDER, 
         ALLOWED_EXTENSIONS, OPENROUTER_API_KEY, MODEL_NAME,
-        MAX_TOKENS, TEMPERATURE, SITE_URL, SITE_NAME, DEBUG
+        MAX_TOKENS, TEMPERATURE, SITE_URL, SITE_NAME, DEBUG,
+        QA_DOCUMENT_CHARS, QA_HISTORY_TOKEN_BUDGET, QA_HISTORY_KEEP_TURNS,
+        QA_SUMMARY_MAX_TOKENS, QA_MAX_SESSIONS
     )
 except ImportError as e:
     print(f"Config import error: {e}")
@@ -30,6 +37,11 @@ except ImportError as e:
     SITE_URL = 'http://localhost:5000'
     SITE_NAME = 'JuryBot'
     DEBUG = True
+    QA_DOCUMENT_CHARS = 6000
+    QA_HISTORY_TOKEN_BUDGET = 1500
+    QA_HISTORY_KEEP_TURNS = 2
+    QA_SUMMARY_MAX_TOKENS = 300
+    QA_MAX_SESSIONS = 100
 
 # Optional DOCX support
 try:
@@ -179,36 +191,199 @@ def analyze_legal_document(text):
         }
 
 
-def answer_question(document_text, question):
-    """Answer specific questions about the legal document"""
-    try:
-        completion = client.chat.completions.create(
-            extra_headers={
-                "HTTP-Referer": SITE_URL,
-                "X-Title": SITE_NAME,
-            },
-            model=MODEL_NAME,
-            messages=[
-                {
-                    "role": "user",
-                    "content": f"""
-                    You are a legal expert. Answer the following question about this legal document in simple, clear language:
+# Question sessions, keyed by session id (oldest evicted first)
+qa_sessions = OrderedDict()
+qa_sessions_lock = threading.Lock()
 
-                    Document: {document_text[:2000]}
+# Kept byte-identical across requests so providers can cache the prompt prefix
+QA_SYSTEM_PROMPT = (
+    "You are a legal expert. Answer questions about the legal document provided "
+    "in simple, clear language. Provide clear, concise answers that a non-lawyer "
+    "can understand."
+)
 
-                    Question: {question}
 
-                    Provide a clear, concise answer that a non-lawyer can understand.
-                    """
-                }
-            ],
-            max_tokens=MAX_TOKENS,
-            temperature=TEMPERATURE
-        )
+def estimate_tokens(text):
+    """Roughly estimate the token count of a string"""
+    return len(text) // 4
+
+
+def estimate_turn_tokens(turn):
+    """Roughly estimate the token count of a question/answer turn"""
+    return estimate_tokens(turn['question']) + estimate_tokens(turn['answer'])
 
-        return completion.choices[0].message.content
+
+def get_or_create_session(session_id, document_text):
+    """Return an existing question session or start a new one for the document"""
+    document_hash = hashlib.sha256(document_text.encode('utf-8', errors='ignore')).hexdigest()
+    with qa_sessions_lock:
+        session = qa_sessions.get(session_id) if session_id else None
+        if session and session['document_hash'] == document_hash:
+            qa_sessions.move_to_end(session_id)
+            return session
+
+        # Only the context actually sent to the model is kept in memory
+        session = {
+            'id': uuid.uuid4().hex,
+            'document_hash': document_hash,
+            'document_context': document_text[:QA_DOCUMENT_CHARS],
+            'summary': '',
+            'history': [],
+            'lock': threading.Lock()
+        }
+        qa_sessions[session['id']] = session
+        while len(qa_sessions) > QA_MAX_SESSIONS:
+            qa_sessions.popitem(last=False)
+        return session
+
+
+def build_question_messages(session, question):
+    """Build the chat messages for a question.
+
+    The system prompt and document context come first and never change within
+    a session, followed by the summarized and recent history, then the question.
+    """
+    messages = [
+        {"role": "system", "content": QA_SYSTEM_PROMPT},
+        {
+            "role": "user",
+            "content": f"Document:\n{session['document_context']}"
+        }
+    ]
+    if session['summary']:
+        messages.append({
+            "role": "user",
+            "content": f"Summary of our earlier conversation:\n{session['summary']}"
+        })
+    for turn in session['history']:
+        messages.append({"role": "user", "content": turn['question']})
+        messages.append({"role": "assistant", "content": turn['answer']})
+    messages.append({"role": "user", "content": question})
+    return messages
+
+
+def get_usage_stats(completion, started):
+    """Extract token usage, including cached prompt tokens, from a completion"""
+    stats = {'latency_ms': int((time.perf_counter() - started) * 1000)}
+    usage = getattr(completion, 'usage', None)
+    if not usage:
+        return stats
+
+    details = getattr(usage, 'prompt_tokens_details', None)
+    if isinstance(details, dict):
+        cached_tokens = details.get('cached_tokens')
+    else:
+        cached_tokens = getattr(details, 'cached_tokens', None)
+
+    stats.update({
+        'prompt_tokens': getattr(usage, 'prompt_tokens', None),
+        'completion_tokens': getattr(usage, 'completion_tokens', None),
+        'cached_tokens': cached_tokens or 0
+    })
+    return stats
+
+
+def summarize_history(summary, turns):
+    """Fold older question/answer turns into the running conversation summary.
+
+    Returns the new summary and the usage stats of the summarization call.
+    """
+    started = time.perf_counter()
+    transcript = "\n\n".join(
+        f"Q: {turn['question']}\nA: {turn['answer']}" for turn in turns
+    )
+    completion = client.chat.completions.create(
+        extra_headers={
+            "HTTP-Referer": SITE_URL,
+            "X-Title": SITE_NAME,
+        },
+        model=MODEL_NAME,
+        messages=[
+            {
+                "role": "user",
+                "content": f"""
+                Summarize this conversation about a legal document in a few sentences.
+                Keep every fact, answer and concern the user may refer back to.
+
+                Earlier summary: {summary or 'None'}
+
+                Conversation:
+                {transcript}
+                """
+            }
+        ],
+        max_tokens=QA_SUMMARY_MAX_TOKENS,
+        temperature=TEMPERATURE
+    )
+    return completion.choices[0].message.content or '', get_usage_stats(completion, started)
+
+
+def compact_history(session):
+    """Summarize older turns once the history exceeds the token budget.
+
+    Up to QA_HISTORY_KEEP_TURNS recent turns are kept verbatim, fewer if those
+    turns alone exceed the budget. Returns the usage stats of the summarization
+    call, or None if nothing was summarized. If summarization fails the older
+    turns are dropped instead, so the history stays bounded.
+    """
+    history = session['history']
+    history_tokens = estimate_tokens(session['summary']) + sum(
+        estimate_turn_tokens(turn) for turn in history
+    )
+    if history_tokens <= QA_HISTORY_TOKEN_BUDGET:
+        return None
+
+    keep = min(QA_HISTORY_KEEP_TURNS, len(history))
+    while keep and sum(estimate_turn_tokens(turn) for turn in history[-keep:]) > QA_HISTORY_TOKEN_BUDGET:
+        keep -= 1
+    split = len(history) - keep
+    if not split:
+        return None
+
+    try:
+        summary, stats = summarize_history(session['summary'], history[:split])
+        if summary:
+            session['summary'] = summary
     except Exception as e:
-        return f"Unable to answer question: {str(e)}"
+        print(f"History summarization failed: {e}")
+        stats = None
+    session['history'] = history[split:]
+    return stats
+
+
+def answer_question(session, question):
+    """Answer a question about the session's document, keeping the conversation history"""
+    with session['lock']:
+        # History left over budget by the previous turn is compacted first
+        summarization = compact_history(session)
+        started = time.perf_counter()
+        try:
+            completion = client.chat.completions.create(
+                extra_headers={
+                    "HTTP-Referer": SITE_URL,
+                    "X-Title": SITE_NAME,
+                },
+                model=MODEL_NAME,
+                messages=build_question_messages(session, question),
+                max_tokens=MAX_TOKENS,
+                temperature=TEMPERATURE
+            )
+
+            answer = completion.choices[0].message.content
+            usage = get_usage_stats(completion, started)
+        except Exception as e:
+            answer = f"Unable to answer question: {str(e)}"
+            usage = get_usage_stats(None, started)
+        else:
+            if answer:
+                session['history'].append({'question': question, 'answer': answer})
+            else:
+                # Reasoning models can spend max_tokens before producing any content
+                answer = "Unable to answer question: the model returned an empty response."
+
+        if summarization:
+            usage['summarization'] = summarization
+        return answer, usage
 
 
 @app.route('/api/upload', methods=['POST'])
@@ -272,6 +447,9 @@ def ask_question():
         data = request.get_json()
         question = data.get('question', '')
         document_text = data.get('document_text', '')
+        session_id = data.get('session_id', '')
+        if not isinstance(session_id, str):
+            session_id = ''
 
         if not document_text:
             return jsonify({'error': 'No document provided'}), 400
@@ -279,12 +457,15 @@ def ask_question():
         if not question:
             return jsonify({'error': 'No question provided'}), 400
 
-        answer = answer_question(document_text, question)
+        session = get_or_create_session(session_id, document_text)
+        answer, usage = answer_question(session, question)
 
         return jsonify({
             'success': True,
             'answer': answer,
-            'question': question
+            'question': question,
+            'session_id': session['id'],
+            'usage': usage
         })
 
     except Exception as e:
@@ -30,6 +30,13 @@ MODEL_NAME = os.getenv('MODEL_NAME', 'openai/gpt-oss-20b:free')
 MAX_TOKENS = get_int('MAX_TOKENS', 4000)
 TEMPERATURE = float(os.getenv('TEMPERATURE', '0.3'))
 
+# Question & Answer Session Configuration
+QA_DOCUMENT_CHARS = get_int('QA_DOCUMENT_CHARS', 6000)  # Document context sent with every question
+QA_HISTORY_TOKEN_BUDGET = get_int('QA_HISTORY_TOKEN_BUDGET', 1500)  # Summarize history beyond this
+QA_HISTORY_KEEP_TURNS = get_int('QA_HISTORY_KEEP_TURNS', 2)  # Recent turns kept verbatim
+QA_SUMMARY_MAX_TOKENS = get_int('QA_SUMMARY_MAX_TOKENS', 300)  # Length limit for history summaries
+QA_MAX_SESSIONS = get_int('QA_MAX_SESSIONS', 100)  # Sessions kept in memory, oldest evicted first
+
 # Flask Configuration
 SECRET_KEY = os.getenv('SECRET_KEY', 'b1ce3f53e0ef70564b4b8fa8a4aad34de21987f151bca587867f83e3c9ce5aea')
 DEBUG = get_bool('DEBUG', True)
@@ -0,0 +1,156 @@
+from types import SimpleNamespace
+
+import pytest
+
+import app
+
+
+def make_completion(content, cached_tokens=None, details_as_dict=False):
+    """Build a stub chat completion with usage stats"""
+    details = {'cached_tokens': cached_tokens}
+    usage = SimpleNamespace(
+        prompt_tokens=1200,
+        completion_tokens=50,
+        prompt_tokens_details=details if details_as_dict else SimpleNamespace(**details)
+    )
+    message = SimpleNamespace(content=content)
+    return SimpleNamespace(usage=usage, choices=[SimpleNamespace(message=message)])
+
+
+class StubCompletions:
+    def __init__(self, content='answer'):
+        self.content = content
+        self.calls = []
+
+    def create(self, **kwargs):
+        self.calls.append(kwargs)
+        return make_completion(self.content, cached_tokens=1024)
+
+
+@pytest.fixture
+def completions(monkeypatch):
+    stub = StubCompletions()
+    monkeypatch.setattr(app, 'client', SimpleNamespace(chat=SimpleNamespace(completions=stub)))
+    return stub
+
+
+def test_prompt_prefix_is_stable_across_turns(completions):
+    session = app.get_or_create_session('', 'Tenant pays rent monthly.')
+    app.answer_question(session, 'When is rent due?')
+    app.answer_question(session, 'What if I pay late?')
+
+    first, second = (call['messages'] for call in completions.calls)
+    assert first[:2] == second[:2]
+    assert second[-1] == {'role': 'user', 'content': 'What if I pay late?'}
+    assert app.get_or_create_session(session['id'], 'Tenant pays rent monthly.') is session
+
+
+def test_compact_history_keeps_recent_turns(completions, monkeypatch):
+    monkeypatch.setattr(app, 'QA_HISTORY_TOKEN_BUDGET', 25)
+    monkeypatch.setattr(app, 'QA_HISTORY_KEEP_TURNS', 2)
+    completions.content = 'summary'
+    session = app.get_or_create_session('', 'Document text')
+    session['history'] = [{'question': f'q{i}', 'answer': 'a' * 40} for i in range(5)]
+
+    stats = app.compact_history(session)
+
+    assert session['summary'] == 'summary'
+    assert [turn['question'] for turn in session['history']] == ['q3', 'q4']
+    assert stats['cached_tokens'] == 1024
+    assert completions.calls[0]['max_tokens'] == app.QA_SUMMARY_MAX_TOKENS
+
+
+@pytest.mark.parametrize('details_as_dict', [True, False])
+def test_get_usage_stats_reads_cached_tokens(details_as_dict):
+    completion = make_completion('answer', cached_tokens=512, details_as_dict=details_as_dict)
+
+    stats = app.get_usage_stats(completion, 0)
+
+    assert stats['cached_tokens'] == 512
+    assert stats['prompt_tokens'] == 1200
+    assert stats['completion_tokens'] == 50
+
+
+def test_compact_history_drops_kept_turns_over_budget(completions, monkeypatch):
+    monkeypatch.setattr(app, 'QA_HISTORY_TOKEN_BUDGET', 100)
+    monkeypatch.setattr(app, 'QA_HISTORY_KEEP_TURNS', 2)
+    completions.content = 'summary'
+    session = app.get_or_create_session('', 'Document text')
+    session['history'] = [{'question': f'q{i}', 'answer': 'a' * 300} for i in range(3)]
+
+    app.compact_history(session)
+
+    assert [turn['question'] for turn in session['history']] == ['q2']
+
+
+def test_empty_answer_does_not_break_follow_ups(completions, monkeypatch):
+    monkeypatch.setattr(app, 'QA_HISTORY_TOKEN_BUDGET', 10)
+    completions.content = None
+    session = app.get_or_create_session('', 'Document text')
+
+    answer, usage = app.answer_question(session, 'First question?')
+    assert answer.startswith('Unable to answer question')
+    assert 'latency_ms' in usage
+    assert session['history'] == []
+
+    completions.content = 'answer'
+    answer, _ = app.answer_question(session, 'Follow-up?')
+    assert answer == 'answer'
+
+
+def test_empty_summary_keeps_previous_summary(completions, monkeypatch):
+    monkeypatch.setattr(app, 'QA_HISTORY_TOKEN_BUDGET', 25)
+    completions.content = None
+    session = app.get_or_create_session('', 'Document text')
+    session['summary'] = 'earlier summary'
+    session['history'] = [{'question': f'q{i}', 'answer': 'a' * 40} for i in range(4)]
+
+    app.compact_history(session)
+
+    assert session['summary'] == 'earlier summary'
+    assert [turn['question'] for turn in session['history']] == ['q2', 'q3']
+
+
+def test_failed_answer_reports_summarization(monkeypatch):
+    class FailingAnswers(StubCompletions):
+        def create(self, **kwargs):
+            if kwargs['max_tokens'] != app.QA_SUMMARY_MAX_TOKENS:
+                raise RuntimeError('provider down')
+            return super().create(**kwargs)
+
+    stub = FailingAnswers('summary')
+    monkeypatch.setattr(app, 'client', SimpleNamespace(chat=SimpleNamespace(completions=stub)))
+    monkeypatch.setattr(app, 'QA_HISTORY_TOKEN_BUDGET', 10)
+    session = app.get_or_create_session('', 'Document text')
+    session['history'] = [{'question': f'q{i}', 'answer': 'a' * 40} for i in range(4)]
+
+    answer, usage = app.answer_question(session, 'Question?')
+
+    assert answer == 'Unable to answer question: provider down'
+    assert 'latency_ms' in usage
+    assert usage['summarization']['cached_tokens'] == 1024
+
+
+def ask(client, **payload):
+    response = client.post('/api/ask_question', json={'question': 'Question?', **payload})
+    return response.status_code, response.get_json()
+
+
+def test_ask_question_route_sessions(completions):
+    client = app.app.test_client()
+
+    status, data = ask(client, document_text='First document')
+    assert status == 200
+    session_id = data['session_id']
+    assert data['usage']['cached_tokens'] == 1024
+
+    status, data = ask(client, document_text='First document', session_id=session_id)
+    assert data['session_id'] == session_id
+    assert len(completions.calls[-1]['messages']) == 5
+
+    status, data = ask(client, document_text='Second document', session_id=session_id)
+    assert data['session_id'] != session_id
+
+    status, data = ask(client, document_text='First document', session_id=['not', 'a', 'string'])
+    assert status == 200
+    assert data['session_id'] != session_id
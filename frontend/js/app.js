@@ -25,6 +25,9 @@ const explanationText = document.getElementById('explanationText');
 // Global variable to store current document text
 let currentDocumentText = '';
 
+// Question session id, so follow-up questions keep the conversation history
+let currentSessionId = '';
+
 // Initialize the application
 document.addEventListener('DOMContentLoaded', function() {
     initializeApp();
@@ -142,6 +145,7 @@ async function handleFileUpload(e) {
         if (data.success) {
             // Store document text for future questions
             currentDocumentText = data.document_text || '';
+            currentSessionId = '';
             showResults(data.analysis);
         } else {
             showError(data.error || 'Upload failed. Please try again.');
@@ -178,6 +182,7 @@ async function handleTextAnalysis(e) {
         if (data.success) {
             // Store document text for future questions
             currentDocumentText = text;
+            currentSessionId = '';
             showResults(data.analysis);
         } else {
             showError(data.error || 'Analysis failed. Please try again.');
@@ -217,13 +222,15 @@ async function handleQuestion(e) {
             },
             body: JSON.stringify({ 
                 question: question,
-                document_text: currentDocumentText
+                document_text: currentDocumentText,
+                session_id: currentSessionId
             })
         });
         
         const data = await response.json();
         
         if (data.success) {
+            currentSessionId = data.session_id || '';
             showQuestionAnswer(data.answer, question);
         } else {
             showError(data.error || 'Failed to get answer. Please try again.');
@@ -411,6 +418,7 @@ function resetApp() {
     
     // Clear stored document text
     currentDocumentText = '';
+    currentSessionId = '';
     
     // Hide all sections except upload
     uploadSection.style.display = 'block';